@@ -3,32 +3,30 @@ from dotenv import load_dotenv
 import logging
 from typing import Dict, Optional
 
+# Load .env once at import; load_dotenv returns False when the file is missing
+_DOTENV_LOADED = load_dotenv('.env', override=False)
+
+# Credentials snapshotted once so repeated lookups are plain dict reads
+_CREDS = {
+    key: os.environ.get(key)
+    for key in ('GEMINI_API_KEY', 'DB_USER', 'DB_HOST', 'DB_PASSWORD', 'DB_DATABASE')
+}
+
 class ConfigHandler:
     def __init__(self):
         self.logger = logging.getLogger('ConfigHandler')
         self._load_environment()
 
     def _load_environment(self) -> None:
-        """Load environment variables from .env file."""
-        # Try to load from .env file
-        if os.path.exists('.env'):
-            load_dotenv()
-        else:
+        """Report whether the .env file was found when the module was loaded."""
+        if not _DOTENV_LOADED:
             self.logger.warning(".env file not found. Falling back to environment variables.")
 
     def get_credentials(self) -> Optional[Dict[str, str]]:
         """
         Get API credentials from environment variables.
-        
+
         Returns:
             Dictionary containing API credentials or None if missing credentials
         """
-        required_vars = {
-            'GEMINI_API_KEY' : os.getenv('GEMINI_API_KEY'),
-            'DB_USER' : os.getenv('DB_USER'),
-            'DB_HOST' : os.getenv('DB_HOST'),
-            'DB_PASSWORD' : os.getenv('DB_PASSWORD'),
-            'DB_DATABASE' : os.getenv('DB_DATABASE'),
-        }
-
-        return required_vars
\ No newline at end of file
+        return dict(_CREDS)
\ No newline at end of file
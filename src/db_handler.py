@@ -1,7 +1,7 @@
 # src/database/connector.py
 
-import mysql.connector
 from mysql.connector import Error
+from mysql.connector.pooling import MySQLConnectionPool
 from typing import Dict, List, Optional, Any
 import logging
 from dataclasses import dataclass
@@ -16,44 +16,64 @@ class DatabaseConfig:
     port: int = 3306
 
 class DatabaseConnector:
-    def __init__(self, database_username:str, database_password:str, database_hostname:str, database_name:str, port=3306):
+    def __init__(self, database_username:str, database_password:str, database_hostname:str, database_name:str, port=3306, pool_size:int=8, compress:bool=True):
         """Initialize database connector with either config file or direct parameters."""
         self.database_username = database_username
         self.database_password = database_password
         self.database_hostname = database_hostname
         self.database_name = database_name
         self.port = port
-        self._connection = None
+        self.pool_size = pool_size
+        self.compress = compress
         self._setup_logging()
+        self._pool = self._create_pool()
 
     def _setup_logging(self):
-        """Configure logging for the database operations."""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
+        """Get the logger for the database operations; handlers are configured by the application."""
         self.logger = logging.getLogger(__name__)
 
 
+    def _create_pool(self) -> MySQLConnectionPool:
+        """Create the connection pool that all queries lease connections from."""
+        try:
+            return MySQLConnectionPool(
+                pool_name="analyzer",
+                pool_size=self.pool_size,
+                pool_reset_session=False,
+                host=self.database_hostname,
+                user=self.database_username,
+                password=self.database_password,
+                database=self.database_name,
+                port=self.port,
+                # Use the C extension when it is installed; mysql.connector falls back to pure Python otherwise
+                use_pure=False,
+                compress=self.compress
+            )
+        except Error as e:
+            self.logger.error(f"Error creating MySQL connection pool: {e}")
+            raise
+
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections."""
+        """Context manager that leases a pooled connection and returns it on exit."""
         try:
-            if not self._connection or not self._connection.is_connected():
-                self._connection = mysql.connector.connect(
-                    host=self.database_hostname,
-                    user=self.database_username,
-                    password=self.database_password,
-                    database=self.database_name,
-                    port=self.port
-                )
-            yield self._connection
+            connection = self._pool.get_connection()
         except Error as e:
             self.logger.error(f"Error connecting to MySQL: {e}")
             raise
+        try:
+            yield connection
+        except Error as e:
+            self.logger.error(f"Error querying MySQL: {e}")
+            raise
         finally:
-            if self._connection and self._connection.is_connected():
-                self._connection.close()
+            # Closing a pooled connection hands it back to the pool
+            connection.close()
+
+    def close(self):
+        """Close every idle pooled connection. Call once when the application shuts down."""
+        # The pool has no public shutdown; _remove_connections closes and drops idle connections
+        self._pool._remove_connections()
 
 """
 # Usage example:
@@ -1,127 +1,195 @@
-from typing import Dict, List, Any
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Tuple
 from db_handler import DatabaseConnector
 import logging
+import time
+
+# Introspected schemas keyed by "host/database", stored with the time they were fetched
+_schema_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_TTL = 300.0
+# Rows pulled per round trip when streaming information_schema results
+_FETCH_SIZE = 1000
 
 class SchemaAnalyzer:
+    _COLUMNS_SQL = """
+        SELECT
+            TABLE_NAME,
+            COLUMN_NAME,
+            DATA_TYPE,
+            CHARACTER_MAXIMUM_LENGTH,
+            IS_NULLABLE,
+            COLUMN_DEFAULT,
+            COLUMN_KEY,
+            EXTRA,
+            COLUMN_COMMENT
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = %s
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """
+
+    _RELS_SQL = """
+        SELECT
+            TABLE_NAME,
+            CONSTRAINT_NAME,
+            COLUMN_NAME,
+            REFERENCED_TABLE_NAME,
+            REFERENCED_COLUMN_NAME
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = %s
+            AND REFERENCED_TABLE_NAME IS NOT NULL
+        ORDER BY TABLE_NAME
+    """
+
+    _META_SQL = """
+        SELECT
+            TABLE_NAME,
+            TABLE_COMMENT,
+            ENGINE,
+            ROW_FORMAT,
+            CREATE_TIME,
+            UPDATE_TIME
+        FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = %s
+        ORDER BY TABLE_NAME
+    """
+
+    # One-row summary that changes whenever a table, column or foreign key definition changes
+    _FINGERPRINT_SQL = """
+        SELECT
+            (SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s),
+            (SELECT MAX(CREATE_TIME) FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s),
+            (SELECT SUM(CRC32(CONCAT_WS('|', TABLE_NAME, TABLE_COMMENT)))
+             FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s),
+            (SELECT SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE,
+                                        IS_NULLABLE, COALESCE(COLUMN_DEFAULT, '<NULL>'),
+                                        COLUMN_KEY, EXTRA, COLUMN_COMMENT)))
+             FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s),
+            (SELECT SUM(CRC32(CONCAT_WS('|', TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME,
+                                        REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME)))
+             FROM information_schema.KEY_COLUMN_USAGE
+             WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL)
+    """
+
     def __init__(self, db_connector: DatabaseConnector):
         self.db_connector = db_connector
         self.logger = logging.getLogger(__name__)
 
-    def analyze_schema(self) -> Dict[str, Any]:
+    def analyze_schema(self, force_refresh: bool = False) -> Dict[str, Any]:
         """
         Analyze the database schema and return a structured dictionary of the findings.
+
+        Results are cached in memory for a few minutes since schemas rarely change
+        between runs. Pass force_refresh=True to re-read information_schema.
         """
+        cache_key = f"{self.db_connector.database_hostname}/{self.db_connector.database_name}"
+        cached = _schema_cache.get(cache_key)
+        if not force_refresh and cached and time.monotonic() - cached[0] < _TTL:
+            self.logger.info("Using cached schema information")
+            return cached[1]
+
         schema_info = {
             "database_name": self.db_connector.database_name,
             "tables": self._get_tables_info()
         }
+        _schema_cache[cache_key] = (time.monotonic(), schema_info)
         return schema_info
 
+    def schema_fingerprint(self) -> str:
+        """
+        Cheaply summarize the current schema definition with a single query.
+
+        The fingerprint changes when tables are added, dropped or recreated, or when
+        a table comment, column definition or foreign key changes, so it can key caches
+        of the full analysis.
+        """
+        database_name = self.db_connector.database_name
+        with self.db_connector.get_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(self._FINGERPRINT_SQL, (database_name,) * 5)
+            table_count, last_created, tables_checksum, columns_checksum, keys_checksum = cursor.fetchone()
+        return f"{table_count}:{last_created}:{tables_checksum}:{columns_checksum}:{keys_checksum}"
+
     def _get_tables_info(self) -> List[Dict[str, Any]]:
         """Get detailed information about all tables in the database."""
+        # One query per metadata type for the whole schema, each on its own pooled
+        # connection so the round trips overlap, then grouped by table in Python
+        with ThreadPoolExecutor(max_workers=min(3, self.db_connector.pool_size)) as executor:
+            columns_future = executor.submit(self._get_all_columns)
+            relationships_future = executor.submit(self._get_all_relationships)
+            metadata_future = executor.submit(self._get_all_metadata)
+
+            columns_by_table = columns_future.result()
+            relationships_by_table = relationships_future.result()
+            metadata_by_table = metadata_future.result()
+
         tables_info = []
-        
-        with self.db_connector.get_connection() as connection:
-            cursor = connection.cursor(dictionary=True)
-            
-            # Get all tables
-            cursor.execute("""
-                SELECT TABLE_NAME 
-                FROM information_schema.TABLES 
-                WHERE TABLE_SCHEMA = %s
-            """, (self.db_connector.database_name,))
-            
-            tables = cursor.fetchall()
-            
-            for table in tables:
-                table_name = table['TABLE_NAME']
-                table_info = {
-                    "table_name": table_name,
-                    "columns": self._get_columns_info(cursor, table_name),
-                    "relationships": self._get_relationships(cursor, table_name),
-                    "metadata": self._get_table_metadata(cursor, table_name)
-                }
-                tables_info.append(table_info)
-                
+        for table_name, metadata in metadata_by_table.items():
+            table_info = {
+                "table_name": table_name,
+                "columns": columns_by_table[table_name],
+                "relationships": relationships_by_table[table_name],
+                "metadata": metadata
+            }
+            tables_info.append(table_info)
+
         return tables_info
 
-    def _get_columns_info(self, cursor, table_name: str) -> List[Dict[str, Any]]:
-        """Get detailed information about columns in a table."""
-        cursor.execute("""
-            SELECT 
-                COLUMN_NAME,
-                DATA_TYPE,
-                CHARACTER_MAXIMUM_LENGTH,
-                IS_NULLABLE,
-                COLUMN_DEFAULT,
-                COLUMN_KEY,
-                EXTRA,
-                COLUMN_COMMENT
-            FROM information_schema.COLUMNS 
-            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
-        """, (self.db_connector.database_name, table_name))
-        
-        columns = []
-        for column in cursor.fetchall():
-            column_info = {
-                "name": column['COLUMN_NAME'],
-                "data_type": column['DATA_TYPE'],
-                "max_length": column['CHARACTER_MAXIMUM_LENGTH'],
-                "is_nullable": column['IS_NULLABLE'] == 'YES',
-                "default_value": column['COLUMN_DEFAULT'],
-                "is_primary": column['COLUMN_KEY'] == 'PRI',
-                "is_unique": column['COLUMN_KEY'] in ('UNI', 'PRI'),
-                "auto_increment": 'auto_increment' in column['EXTRA'].lower(),
-                "comment": column['COLUMN_COMMENT']
-            }
-            columns.append(column_info)
-        
+    def _stream_query(self, sql: str):
+        """Run a schema-wide query on a leased connection and stream its rows as tuples in batches."""
+        with self.db_connector.get_connection() as connection:
+            cursor = connection.cursor(buffered=False)
+            cursor.execute(sql, (self.db_connector.database_name,))
+            while True:
+                batch = cursor.fetchmany(_FETCH_SIZE)
+                if not batch:
+                    break
+                yield from batch
+
+    def _get_all_columns(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get detailed information about the columns of every table, keyed by table name."""
+        columns = defaultdict(list)
+        for (table_name, name, data_type, max_length, is_nullable,
+             default_value, column_key, extra, comment) in self._stream_query(self._COLUMNS_SQL):
+            columns[table_name].append({
+                "name": name,
+                "data_type": data_type,
+                "max_length": max_length,
+                "is_nullable": is_nullable == 'YES',
+                "default_value": default_value,
+                "is_primary": column_key == 'PRI',
+                "is_unique": column_key in ('UNI', 'PRI'),
+                "auto_increment": 'auto_increment' in extra.lower(),
+                "comment": comment
+            })
+
         return columns
 
-    def _get_relationships(self, cursor, table_name: str) -> List[Dict[str, Any]]:
-        """Get foreign key relationships for a table."""
-        cursor.execute("""
-            SELECT
-                CONSTRAINT_NAME,
-                COLUMN_NAME,
-                REFERENCED_TABLE_NAME,
-                REFERENCED_COLUMN_NAME
-            FROM information_schema.KEY_COLUMN_USAGE
-            WHERE TABLE_SCHEMA = %s 
-                AND TABLE_NAME = %s
-                AND REFERENCED_TABLE_NAME IS NOT NULL
-        """, (self.db_connector.database_name, table_name))
-        
-        relationships = []
-        for rel in cursor.fetchall():
-            relationship = {
-                "constraint_name": rel['CONSTRAINT_NAME'],
-                "column_name": rel['COLUMN_NAME'],
-                "referenced_table": rel['REFERENCED_TABLE_NAME'],
-                "referenced_column": rel['REFERENCED_COLUMN_NAME']
-            }
-            relationships.append(relationship)
-            
+    def _get_all_relationships(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get foreign key relationships of every table, keyed by table name."""
+        relationships = defaultdict(list)
+        for (table_name, constraint_name, column_name,
+             referenced_table, referenced_column) in self._stream_query(self._RELS_SQL):
+            relationships[table_name].append({
+                "constraint_name": constraint_name,
+                "column_name": column_name,
+                "referenced_table": referenced_table,
+                "referenced_column": referenced_column
+            })
+
         return relationships
 
-    def _get_table_metadata(self, cursor, table_name: str) -> Dict[str, Any]:
-        """Get metadata about the table."""
-        cursor.execute("""
-            SELECT
-                TABLE_COMMENT,
-                ENGINE,
-                ROW_FORMAT,
-                CREATE_TIME,
-                UPDATE_TIME
-            FROM information_schema.TABLES
-            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
-        """, (self.db_connector.database_name, table_name))
-        
-        metadata = cursor.fetchone()
-        return {
-            "comment": metadata['TABLE_COMMENT'],
-            "engine": metadata['ENGINE'],
-            "row_format": metadata['ROW_FORMAT'],
-            "created_at": metadata['CREATE_TIME'],
-            "updated_at": metadata['UPDATE_TIME']
-        }
\ No newline at end of file
+    def _get_all_metadata(self) -> Dict[str, Dict[str, Any]]:
+        """Get metadata about every table, keyed by table name."""
+        metadata = {}
+        for (table_name, comment, engine, row_format,
+             created_at, updated_at) in self._stream_query(self._META_SQL):
+            metadata[table_name] = {
+                "comment": comment,
+                "engine": engine,
+                "row_format": row_format,
+                "created_at": created_at,
+                "updated_at": updated_at
+            }
+
+        return metadata
@@ -1,27 +1,155 @@
+import asyncio
+import hashlib
 import logging
+import re
 import google.generativeai as genai
-from typing import Dict, Optional
+import orjson
+from google.api_core.exceptions import ResourceExhausted
+from typing import Dict, List, Optional
+
+# Matches one "Field: value" line of the model's per-column analysis, ignoring the Markdown
+# bullets, numbered list markers, headings and bold markers the model sometimes wraps fields in
+_FIELD_RE = re.compile(r'^[ \t>#*-]*(?:\d+[.)][ \t*]*)?([A-Za-z][A-Za-z ]*?)[ \t*]*:[ \t*]*(.+?)[ \t*]*$', re.M)
+
+# Lower-cased field names (and the variants the model sometimes emits) mapped to report fields
+_FIELD_MAP = {
+    'table': 'Table',
+    'table name': 'Table',
+    'column': 'Column',
+    'column name': 'Column',
+    'description': 'Description',
+    'data type': 'Data Type',
+    'type': 'Data Type',
+    'collection method': 'Collection Method',
+    'collection': 'Collection Method',
+    'data source': 'Data Source',
+    'source': 'Data Source',
+    'primary purpose': 'Primary Purpose',
+    'purpose': 'Primary Purpose',
+    'legal basis': 'Legal Basis',
+    'personal data': 'Personal Data',
+    'personal information': 'Personal Information',
+}
+
+# Invariant parts of the analysis prompt, built once and joined around the table schema
+_PROMPT_PREFIX = """
+# ROLE AND CONTEXT
+You are a Data Protection and Privacy Analysis Assistant with expertise in:
+- General Data Protection Regulation of the European Union (GDPR) compliance analysis
+- Protection of Personal Information Act (POPIA) (South Africa) requirements
+- Database structure evaluation
+- Privacy policy development
+- Data classification
+
+Note: Your analysis serves as preliminary guidance and should be reviewed by qualified legal counsel.
+
+INPUT DATA IN JSON FORMAT (a list of one or more tables):
+"""
+
+_PROMPT_SUFFIX = """
+
+# OUTPUT REQUIREMENTS: 
+
+## Required Fields and format te output MUST be in:
+For each column of each table analyze and provide:
+
+Table: [table name]
+Column: [column name]
+Description: [clear description of the data being stored in the column, max 100 words]
+Data Type: [Required/Optional]
+Collection Method: [USER_PROVIDED/USER_USAGE_GENERATED/SYSTEM_USAGE_GENERATED/SYSTEM_SET/THIRD_PARTY]
+Data Source: [ALL/VISITORS/REGISTERED_USERS/THIRD_PARTY]
+Primary Purpose: [clear purpose as to why the data is being gathered, max 100 words]
+Legal Basis: [relevant GDPR/POPIA basis, max 50 words]
+Personal Data: [Yes/No (in reference to GDPR)]
+Personal Information: [Yes/No (in reference to POPIA)]
+
+## Formatting Rules
+1. Each field must start on a new line.
+2. No line breaks within field values
+3. Use exact field names as defined in the INPUT DATA.
+4. One colon after each field name followed by single space
+5. No special characters (commas etc)
+6. Use periods or hyphens for separation where needed.
+7. Maintain consistent capitalization
+8. No additional explanations or formatting
+
+## Analysis Guidelines
+
+### Description Guidelines
+- Reference common CMS/LMS table structures such as Wordpress and Moodle
+- Consider relationships with other visible columns and table name
+- Be specific and concise
+- Focus on data content where possible and not technical aspects
+
+### Legal Classification Guidelines
+Base analysis on:
+- GDPR Article 4 definition of personal data
+- POPIA Chapter 1 definition of personal information
+- Purpose limitation principles
+- Data minimization requirements
+
+### Purpose Guidelines
+- Link to legitimate business functions
+- Demonstrate necessity
+- Show proportionality
+- Identify specific use cases
+
+## OUTPUT VALIDATION
+Your response must:
+1. Be directly parseable using field name patterns
+2. Contain all required fields
+3. Follow exact formatting rules
+4. Stay within word limits
+5. Use only allowed values for categorical fields
+"""
+
+# Available analysis prompts as (prefix, suffix) pairs joined around the table schema
+PROMPT_TEMPLATES = {
+    'gdpr_popia_v1': (_PROMPT_PREFIX, _PROMPT_SUFFIX),
+}
+
+def retry_delay(error: ResourceExhausted, default: float) -> float:
+    """
+    Seconds Gemini asked us to wait after a rate-limit error.
+
+    Reads the Retry-After header of REST responses, or the RetryInfo detail of gRPC
+    errors, and falls back to default when neither is present.
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers['Retry-After'])
+    except (KeyError, TypeError, ValueError):
+        pass
+    for detail in getattr(error, 'details', None) or ():
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    return default
 
 class GeminiClient:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, template_name: str = 'gdpr_popia_v1'):
         """
         Initialize Gemini AI client.
         
         Args:
             api_key: Gemini API key
+            template_name: Key of the PROMPT_TEMPLATES entry used to build prompts
         """
+        if template_name not in PROMPT_TEMPLATES:
+            raise ValueError(f"Unknown prompt template: {template_name}")
         self.api_key = api_key
+        self.template_name = template_name
+        self._prompt_prefix, self._prompt_suffix = PROMPT_TEMPLATES[template_name]
         self.client = None
         self.modle = None
+        # Per-table analyses keyed by a hash of the prompt that produced them
+        self._analysis_cache: Dict[str, List[Optional[List[Dict[str, str]]]]] = {}
         self.setup_logging()
 
 
     def setup_logging(self):
-        """Configure logging for the Gemini client."""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
+        """Get the logger for the Gemini client; handlers are configured by the application."""
         self.logger = logging.getLogger('GeminiClient')
 
     def connect(self) -> bool:
@@ -47,112 +175,145 @@ class GeminiClient:
         """
         try:
 
-            prompt = f"""
-            # ROLE AND CONTEXT
-            You are a Data Protection and Privacy Analysis Assistant with expertise in:
-            - General Data Protection Regulation of the European Union (GDPR) compliance analysis
-            - Protection of Personal Information Act (POPIA) (South Africa) requirements
-            - Database structure evaluation
-            - Privacy policy development
-            - Data classification
-
-            Note: Your analysis serves as preliminary guidance and should be reviewed by qualified legal counsel.
-            
-            INPUT DATA IN PYTHON LIST FORMAT:
-            {table_schema}
+            prompt = self._build_prompt([table_schema])
+            cache_key = self._cache_key(prompt)
+            if cache_key in self._analysis_cache:
+                return self._analysis_cache[cache_key][0]
 
-            # OUTPUT REQUIREMENTS: 
-            
-            ## Required Fields and format te output MUST be in:
-            For each column analyze and provide:
-
-            Column: [column name]
-            Description: [clear description of the data being stored in the column, max 100 words]
-            Data Type: [Required/Optional]
-            Collection Method: [USER_PROVIDED/USER_USAGE_GENERATED/SYSTEM_USAGE_GENERATED/SYSTEM_SET/THIRD_PARTY]
-            Data Source: [ALL/VISITORS/REGISTERED_USERS/THIRD_PARTY]
-            Primary Purpose: [clear purpose as to why the data is being gathered, max 100 words]
-            Legal Basis: [relevant GDPR/POPIA basis, max 50 words]
-            Personal Data: [Yes/No (in reference to GDPR)]
-            Personal Information: [Yes/No (in reference to POPIA)]
-
-            ## Formatting Rules
-            1. Each field must start on a new line.
-            2. No line breaks within field values
-            3. Use exact field names as defined in the INPUT DATA.
-            4. One colon after each field name followed by single space
-            5. No special characters (commas etc)
-            6. Use periods or hyphens for separation where needed.
-            7. Maintain consistent capitalization
-            8. No additional explanations or formatting
-
-            ## Analysis Guidelines
-
-            ### Description Guidelines
-            - Reference common CMS/LMS table structures such as Wordpress and Moodle
-            - Consider relationships with other visible columns and table name
-            - Be specific and concise
-            - Focus on data content where possible and not technical aspects
-
-            ### Legal Classification Guidelines
-            Base analysis on:
-            - GDPR Article 4 definition of personal data
-            - POPIA Chapter 1 definition of personal information
-            - Purpose limitation principles
-            - Data minimization requirements
-
-            ### Purpose Guidelines
-            - Link to legitimate business functions
-            - Demonstrate necessity
-            - Show proportionality
-            - Identify specific use cases
-
-            ## OUTPUT VALIDATION
-            Your response must:
-            1. Be directly parseable using field name patterns
-            2. Contain all required fields
-            3. Follow exact formatting rules
-            4. Stay within word limits
-            5. Use only allowed values for categorical fields
-            """
             response = self.modle.generate_content(prompt)
             analysis = response.text
 
             # Parse the analysis into structured fields
-            analysis_dict = self._parse_analysis(analysis)
-        
+            analyses = self._parse_analysis(analysis, [table_schema['table_name']])
+            self._analysis_cache[cache_key] = analyses
 
-            return analysis_dict
+            return analyses[0]
 
         except Exception as e:
             self.logger.error(f"Error analyzing file {table_schema}")
             return None
 
-    def _parse_analysis(self, analysis: str) -> Dict:
+    async def analyze_table_schema_data_async(self, table_schema) -> Optional[List[Dict[str, str]]]:
         """
-        Parse the analysis text into a list of dictionaries, where each dictionary
-        represents the analysis for a single column.
-        
+        Analyze a table schema using Gemini AI without blocking the event loop.
+
+        Args:
+            table_schema: Dictionary describing the table, as produced by SchemaAnalyzer
+
+        Returns:
+            List of per-column analysis dictionaries, or None if the request failed
+
+        Raises:
+            ResourceExhausted: If Gemini rejected the request for exceeding the rate limit,
+                so the caller can back off and retry
+        """
+        analyses = await self.analyze_table_schemas_batch_async([table_schema])
+        return analyses[0]
+
+    async def analyze_table_schemas_batch_async(self, table_schemas: List[Dict]) -> List[Optional[List[Dict[str, str]]]]:
+        """
+        Analyze several table schemas with a single Gemini request.
+
+        Sharing one prompt spreads its fixed instructions over every table in the batch
+        and uses one request of the rate limit instead of one per table.
+
+        Args:
+            table_schemas: Table dictionaries, as produced by SchemaAnalyzer
+
+        Returns:
+            Per-column analysis lists in the same order as table_schemas, with None for
+            tables the response did not cover or when the request failed
+
+        Raises:
+            ResourceExhausted: If Gemini rejected the request for exceeding the rate limit,
+                so the caller can back off and retry
+        """
+        table_names = [table_schema['table_name'] for table_schema in table_schemas]
+        try:
+            prompt = self._build_prompt(table_schemas)
+            cache_key = self._cache_key(prompt)
+            if cache_key in self._analysis_cache:
+                return self._analysis_cache[cache_key]
+
+            response = await self.modle.generate_content_async(prompt)
+            analyses = self._parse_analysis(response.text, table_names)
+            self._analysis_cache[cache_key] = analyses
+
+            return analyses
+
+        except ResourceExhausted:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error analyzing tables {table_names}: {str(e)}")
+            return [None] * len(table_schemas)
+
+    async def analyze_many(self, schemas: List[Dict], concurrency: int = 8) -> List[Optional[List[Dict[str, str]]]]:
+        """
+        Analyze several table schemas concurrently.
+
+        Args:
+            schemas: Table schema dictionaries to analyze
+            concurrency: Maximum number of requests in flight at once
+
+        Returns:
+            Analysis results in the same order as schemas
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def analyze_one(table_schema):
+            async with semaphore:
+                return await self.analyze_table_schema_data_async(table_schema)
+
+        return await asyncio.gather(*(analyze_one(table_schema) for table_schema in schemas))
+
+    def _build_prompt(self, table_schemas: List[Dict]) -> str:
+        """Build the analysis prompt for a list of table schemas."""
+        # Compact, key-sorted JSON keeps the prompt small and identical for equal schemas
+        payload = orjson.dumps(table_schemas, default=str, option=orjson.OPT_SORT_KEYS).decode()
+        return self._prompt_prefix + payload + self._prompt_suffix
+
+    @staticmethod
+    def _cache_key(prompt: str) -> str:
+        """Stable key for caching the analysis of a prompt."""
+        return hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+
+    def _parse_analysis(self, analysis: str, table_names: List[str]) -> List[Optional[List[Dict[str, str]]]]:
+        """
+        Parse the analysis text into per-column dictionaries, grouped by table.
+
+        A "Table" field, whether written before every column or once as a heading, sets
+        the table for the columns that follow it. With a single table every column is
+        assigned to it.
+
         Args:
             analysis: Raw analysis text from the model.
-            
+            table_names: Names of the tables the analysis was requested for.
+
         Returns:
-            List of dictionaries containing the parsed analysis for each column.
+            One list of column analysis dictionaries per entry of table_names, or None
+            where the analysis covered no columns of that table.
         """
-        parsed_analyses = []
-        
-        for column_analysis in analysis.split('\n\n'):
-            column_analysis = column_analysis.strip()
-            if not column_analysis:
+        by_table = {table_name.lower(): [] for table_name in table_names}
+        current_table = table_names[0].lower() if len(table_names) == 1 else None
+        current = {}
+
+        for match in _FIELD_RE.finditer(analysis):
+            field = _FIELD_MAP.get(match.group(1).lower())
+            if field is None:
                 continue
-            
-            parsed_analysis = {}
-            for line in column_analysis.split('\n'):
-                field, value = line.split(': ', 1)
-                field = field.strip()
-                value = value.strip()
-                parsed_analysis[field] = value
-            
-            parsed_analyses.append(parsed_analysis)
-        
-        return parsed_analyses
\ No newline at end of file
+            value = match.group(2).strip()
+            # A table or column name, or a field seen twice, ends the current column's analysis
+            if current and (field in ('Table', 'Column') or field in current):
+                if current_table in by_table:
+                    by_table[current_table].append(current)
+                current = {}
+            if field == 'Table':
+                if len(table_names) > 1:
+                    current_table = value.strip('`"\' ').lower()
+            else:
+                current[field] = value
+
+        if current and current_table in by_table:
+            by_table[current_table].append(current)
+
+        return [by_table[table_name.lower()] or None for table_name in table_names]
@@ -1,28 +1,56 @@
+import argparse
+import asyncio
+import atexit
+import hashlib
 import logging
-import time
+import queue
+from functools import cached_property, lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional
 from datetime import datetime
-from utils import progress_tracker, append_to_file
+import orjson
+from diskcache import Cache
+from google.api_core.exceptions import ResourceExhausted
+from utils import progress_tracker, append_to_file, RateLimiter
 from config import ConfigHandler
 from db_handler import DatabaseConnector
 from db_schema_analyzer import SchemaAnalyzer
 from sheet_handler import ExcelGenerator
-from gemini_client import GeminiClient  # Your existing AI module
+from gemini_client import GeminiClient, retry_delay  # Your existing AI module
+
+# Prompt used for classification; cached classifications are only reused for the same template
+GEMINI_PROMPT_TEMPLATE = 'gdpr_popia_v1'
+# Gemini requests allowed in flight at once, and per minute (the free tier quota)
+GEMINI_CONCURRENCY = 4
+GEMINI_REQUESTS_PER_MINUTE = 15
+# Columns sent per request; tables are grouped up to this so the reply stays within
+# Gemini's output token limit, which is reached long before the input limit
+GEMINI_BATCH_MAX_COLUMNS = 40
+# Attempts per request, and the back-off used when a rate-limit error gives no delay
+GEMINI_MAX_ATTEMPTS = 3
+GEMINI_RETRY_DELAY = 30.0
+
+# On-disk cache of introspected schemas and per-table AI classifications
+CACHE_DIR = "cache"
+CACHE_EXPIRE_SECONDS = 7 * 86400
+
+@lru_cache(maxsize=1)
+def _load_credentials() -> Dict[str, Any]:
+    """Read the credentials once per process; later analyzers reuse them."""
+    return ConfigHandler().get_credentials()
 
 class PrivacyAnalyzer:
-    def __init__(self):
+    def __init__(self, use_cache: bool = True):
         """Initialize the Privacy Analyzer with configuration."""
         self._setup_logging()
         self.config = self._load_config()
-        self._setup_components()
+        self.cache = Cache(CACHE_DIR) if use_cache else None
 
     def _load_config(self) -> Dict[str, Any]:
         """Load configuration from YAML file."""
         try:
-            configuration = ConfigHandler()
-            credentials = configuration.get_credentials()
-            return credentials
+            return _load_credentials()
         except Exception as e:
             raise ValueError(f"Error loading config file: {str(e)}")
 
@@ -34,33 +62,60 @@ class PrivacyAnalyzer:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         log_file = log_dir / f"privacy_analyzer_{timestamp}.log"
         
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler()
-            ]
-        )
         self.logger = logging.getLogger(__name__)
+        root = logging.getLogger()
+        if root.handlers:
+            # Already configured, e.g. by an earlier analyzer in this process
+            return
 
-    def _setup_components(self):
-        """Initialize all component classes."""
-        try:
-            database_name = self.config['DB_DATABASE']
-            database_user = self.config['DB_USER']
-            database_pw = self.config['DB_PASSWORD']
-            database_host = self.config['DB_HOST']
-            self.db_connector = DatabaseConnector(database_user, database_pw, database_host, database_name)
-            self.schema_analyzer = SchemaAnalyzer(self.db_connector)
-            self.ai_classifier = GeminiClient(api_key=self.config['GEMINI_API_KEY'])
-            self.ai_classifier.connect()
-            self.excel_generator = ExcelGenerator()
-        except Exception as e:
-            self.logger.error(f"Error setting up components: {str(e)}")
-            raise
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        # Callers only enqueue records; the listener thread does the formatting and writing
+        log_queue = queue.SimpleQueue()
+        root.addHandler(QueueHandler(log_queue))
+        root.setLevel(logging.INFO)
+        listener = QueueListener(log_queue, *handlers)
+        listener.start()
+        atexit.register(listener.stop)
+
+    # Components are created on first use, so runs that never reach a component
+    # (e.g. a fully cached analysis never calling Gemini) don't pay for its setup
 
-    def analyze_database(self, database_name: Optional[str] = None) -> str:
+    @cached_property
+    def db_connector(self) -> DatabaseConnector:
+        """Database connector, created with its connection pool on first use."""
+        database_name = self.config['DB_DATABASE']
+        database_user = self.config['DB_USER']
+        database_pw = self.config['DB_PASSWORD']
+        database_host = self.config['DB_HOST']
+        return DatabaseConnector(database_user, database_pw, database_host, database_name)
+
+    @cached_property
+    def schema_analyzer(self) -> SchemaAnalyzer:
+        """Schema analyzer for the configured database."""
+        return SchemaAnalyzer(self.db_connector)
+
+    @cached_property
+    def ai_classifier(self) -> GeminiClient:
+        """Gemini client, connected on first use."""
+        ai_classifier = GeminiClient(api_key=self.config['GEMINI_API_KEY'], template_name=GEMINI_PROMPT_TEMPLATE)
+        ai_classifier.connect()
+        return ai_classifier
+
+    @cached_property
+    def excel_generator(self) -> ExcelGenerator:
+        """Excel report generator."""
+        return ExcelGenerator()
+
+    def close(self):
+        """Release the database connections, if the connector was ever created."""
+        if 'db_connector' in self.__dict__:
+            self.db_connector.close()
+
+    async def analyze_database(self, database_name: Optional[str] = None) -> str:
         """
         Perform complete database analysis and generate report.
         Returns the path to the generated report.
@@ -73,11 +128,11 @@ class PrivacyAnalyzer:
             
             # Step 1: Extract schema information
             self.logger.info("Extracting database schema")
-            schema_info = self.schema_analyzer.analyze_schema()
+            schema_info = self._load_schema()
             
             # Step 2: Process schema with AI
             self.logger.info("Analyzing schema with AI classifier")
-            ai_analysis = self._process_schema_with_ai(schema_info)
+            ai_analysis = await self._process_schema_with_ai(schema_info)
             
             # Step 3: Generate Excel report
             self.logger.info("Generating Excel report")
@@ -90,29 +145,151 @@ class PrivacyAnalyzer:
             self.logger.error(f"Error during analysis: {str(e)}")
             raise
 
-    def _process_schema_with_ai(self, schema_info: Dict[str, Any]) -> list:
-        """Process schema information with AI classifier."""
+    def _load_schema(self) -> Dict[str, Any]:
+        """Get the schema, reusing a cached copy while the schema fingerprint is unchanged."""
+        if self.cache is None:
+            return self.schema_analyzer.analyze_schema()
+
+        fingerprint = self.schema_analyzer.schema_fingerprint()
+        cache_key = self._cache_key(
+            f"schema:{self.db_connector.database_hostname}/{self.db_connector.database_name}:{fingerprint}".encode()
+        )
+        schema_info = self.cache.get(cache_key)
+        if schema_info is None:
+            # The schema changed, so the analyzer's in-memory copy may be out of date too
+            schema_info = self.schema_analyzer.analyze_schema(force_refresh=True)
+            self.cache.set(cache_key, schema_info, expire=CACHE_EXPIRE_SECONDS)
+        else:
+            self.logger.info("Schema unchanged since last run, using cached schema")
+        return schema_info
+
+    @staticmethod
+    def _cache_key(content: bytes) -> str:
+        """Content-addressed cache key."""
+        return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+    @classmethod
+    def _table_cache_key(cls, table: Dict[str, Any]) -> str:
+        """
+        Cache key of a table's AI classification.
+
+        Only the table definition and the prompt template go into the key. Metadata that
+        changes with the table's data, such as its update time, does not.
+        """
+        definition = {
+            "template": GEMINI_PROMPT_TEMPLATE,
+            "table_name": table['table_name'],
+            "columns": table['columns'],
+            "relationships": table['relationships'],
+            "comment": table['metadata'].get('comment')
+        }
+        return cls._cache_key(orjson.dumps(definition, default=str, option=orjson.OPT_SORT_KEYS))
+
+    @staticmethod
+    def _covers_all_columns(table: Dict[str, Any], classification: Optional[List[Dict[str, str]]]) -> bool:
+        """Whether a classification has an entry for every column of the table."""
+        if not classification:
+            return False
+        classified = {entry.get('Column', '').strip('`"\' ').lower() for entry in classification}
+        return all(column['name'].lower() in classified for column in table['columns'])
+
+    @staticmethod
+    def _batch_tables(tables: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """Group tables into batches of at most GEMINI_BATCH_MAX_COLUMNS columns; larger tables go alone."""
+        batch, batch_columns = [], 0
+        for table in tables:
+            column_count = len(table['columns'])
+            if batch and batch_columns + column_count > GEMINI_BATCH_MAX_COLUMNS:
+                yield batch
+                batch, batch_columns = [], 0
+            batch.append(table)
+            batch_columns += column_count
+        if batch:
+            yield batch
+
+    async def _process_schema_with_ai(self, schema_info: Dict[str, Any]) -> list:
+        """Process schema information with AI classifier, several tables per request."""
         ai_results = []
         # For tracking purposes
         tables = schema_info['tables']
         total_tables = len(tables)
-        # Now going through & keeping track
-        for table_pos, table in enumerate(tables):
-            table_name = table['table_name']
-            
-            # Get AI classification
-            classification = self.ai_classifier.analyze_table_schema_data(table)
-            
+
+        # Classifications by table name, starting with those cached by earlier runs
+        classifications = {}
+        pending = []
+        for table in tables:
+            classification = None
+            if self.cache is not None:
+                classification = self.cache.get(self._table_cache_key(table))
+            if classification is None:
+                pending.append(table)
+            else:
+                classifications[table['table_name']] = classification
+        # Cached tables count as done, so progress is reported against every table
+        completed = total_tables - len(pending)
+
+        # The semaphore caps requests in flight, the limiter keeps us inside the per-minute quota
+        semaphore = asyncio.Semaphore(GEMINI_CONCURRENCY)
+        limiter = RateLimiter(GEMINI_REQUESTS_PER_MINUTE, 60)
+
+        async def classify(batch):
+            nonlocal completed
+            # Tables a multi-table reply left incomplete, e.g. when it hit the output limit
+            retry = []
+            try:
+                for attempt in range(1, GEMINI_MAX_ATTEMPTS + 1):
+                    try:
+                        async with semaphore, limiter:
+                            batch_classifications = await self.ai_classifier.analyze_table_schemas_batch_async(batch)
+                        break
+                    except ResourceExhausted as e:
+                        if attempt == GEMINI_MAX_ATTEMPTS:
+                            raise
+                        # Hold back every queued request, not just this one, for as long as Gemini asked
+                        delay = retry_delay(e, GEMINI_RETRY_DELAY)
+                        table_names = ', '.join(table['table_name'] for table in batch)
+                        self.logger.warning(f"Gemini rate limit hit for {table_names}, retrying in {delay:.0f}s")
+                        limiter.defer(delay)
+                for table, classification in zip(batch, batch_classifications):
+                    if self._covers_all_columns(table, classification):
+                        classifications[table['table_name']] = classification
+                        if self.cache is not None:
+                            self.cache.set(self._table_cache_key(table), classification, expire=CACHE_EXPIRE_SECONDS)
+                    elif len(batch) > 1:
+                        retry.append(table)
+                    elif classification:
+                        # Still incomplete on its own; report what we have but don't cache it
+                        classifications[table['table_name']] = classification
+            finally:
+                # A failed batch is finished too; its tables are reported as missing below
+                completed += len(batch) - len(retry)
+                progress_tracker(total_tables, completed)
+
+            if retry:
+                table_names = ', '.join(table['table_name'] for table in retry)
+                self.logger.warning(f"Incomplete classification for {table_names}, retrying one table per request")
+                await classify_all([table] for table in retry)
+
+        async def classify_all(batches):
+            batches = list(batches)
+            outcomes = await asyncio.gather(*(classify(batch) for batch in batches), return_exceptions=True)
+            for batch, outcome in zip(batches, outcomes):
+                if isinstance(outcome, BaseException):
+                    table_names = ', '.join(table['table_name'] for table in batch)
+                    self.logger.error(f"AI classification failed for {table_names}: {outcome!r}")
+
+        await classify_all(self._batch_tables(pending))
+
+        for table in tables:
+            classification = classifications.get(table['table_name'])
             # Add to results
             if classification:
                 ai_results.append({
-                    "table_name": table_name,
+                    "table_name": table['table_name'],
                     "column_report": classification
                 })
             else:
                 append_to_file("Ai Analysis errors.txt", f"Did not do classification on {str(schema_info)}. Tables total: {str(total_tables)}")
-            progress_tracker(total_tables, table_pos+1)
-            time.sleep(3.9)
         
         return ai_results
 
@@ -122,10 +299,18 @@ class PrivacyAnalyzer:
 
 def main():
     """Main entry point for the application."""
+    parser = argparse.ArgumentParser(description="Analyze a database schema for privacy-relevant data.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore cached schemas and AI classifications from previous runs")
+    args = parser.parse_args()
+
     try:
-        analyzer = PrivacyAnalyzer()
+        analyzer = PrivacyAnalyzer(use_cache=not args.no_cache)
         
-        report_path = analyzer.analyze_database()
+        try:
+            report_path = asyncio.run(analyzer.analyze_database())
+        finally:
+            analyzer.close()
         print(f"\nAnalysis complete! Report generated at: {report_path}")
         
     except Exception as e:
@@ -1,3 +1,15 @@
+import asyncio
+import atexit
+import time
+
+# Append handles kept open for the life of the process, keyed by filename
+_handles = {}
+
+@atexit.register
+def _close_handles():
+    for handle in _handles.values():
+        handle.close()
+
 def progress_tracker(total:int, done:int):
     """
     Track the progress of completion. 
@@ -8,14 +20,43 @@ def progress_tracker(total:int, done:int):
 def append_to_file(filename, content):
     """
     Append the given content to the specified file. If the file does not exist, it will be created.
+    The file is opened once and kept open, line buffered, for later appends.
     
     Parameters:
     filename (str): The name of the file to append to.
     content (str): The string to be appended to the file.
     """
-    try:
-        with open(filename, 'a') as file:
-            file.write(content + '\n')
-    except FileNotFoundError:
-        with open(filename, 'w') as file:
-            file.write(content + '\n')
\ No newline at end of file
+    handle = _handles.get(filename)
+    if handle is None:
+        handle = _handles[filename] = open(filename, 'a', buffering=1)
+    handle.write(content + '\n')
+
+class RateLimiter:
+    """
+    Async pacer that spaces calls evenly so at most max_rate start per time_period seconds.
+
+    Each caller reserves the next free slot before it waits, so the time a request
+    spends in flight counts towards the spacing instead of being added on top of it.
+    """
+    def __init__(self, max_rate: float, time_period: float = 60.0):
+        self._interval = time_period / max_rate
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        """Wait until the next free slot."""
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def defer(self, delay: float):
+        """Hold back every slot not yet handed out for at least delay seconds, e.g. after a 429."""
+        self._next_slot = max(self._next_slot, time.monotonic() + delay)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
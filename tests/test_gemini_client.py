@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from gemini_client import GeminiClient
+
+
+@pytest.fixture
+def client():
+    # The parser needs no model or API key
+    return GeminiClient.__new__(GeminiClient)
+
+
+def test_parse_analysis_with_table_before_every_column(client):
+    analysis = (
+        "Table: users\n"
+        "Column: id\n"
+        "Description: Row identifier\n"
+        "Table: users\n"
+        "Column: email\n"
+        "Description: Email address\n"
+        "Table: orders\n"
+        "Column: id\n"
+        "Table: orders\n"
+        "Column: total\n"
+    )
+
+    users, orders = client._parse_analysis(analysis, ["users", "orders"])
+
+    assert users == [
+        {"Column": "id", "Description": "Row identifier"},
+        {"Column": "email", "Description": "Email address"},
+    ]
+    assert orders == [{"Column": "id"}, {"Column": "total"}]
+
+
+def test_parse_analysis_with_table_headings(client):
+    analysis = (
+        "### Table: users\n"
+        "Column: id\n"
+        "Column: email\n"
+        "Personal Data: Yes\n"
+        "\n"
+        "### Table: `orders`\n"
+        "Column: id\n"
+        "Column: total\n"
+    )
+
+    users, orders, missing = client._parse_analysis(analysis, ["users", "orders", "audit_log"])
+
+    assert users == [{"Column": "id"}, {"Column": "email", "Personal Data": "Yes"}]
+    assert orders == [{"Column": "id"}, {"Column": "total"}]
+    assert missing is None
+
+
+def test_parse_analysis_single_table_ignores_table_name(client):
+    analysis = "Table: wp_users\nColumn: id\nColumn: user_email\n"
+
+    assert client._parse_analysis(analysis, ["users"]) == [[{"Column": "id"}, {"Column": "user_email"}]]
+
+
+def test_parse_analysis_with_numbered_list_items(client):
+    analysis = (
+        "1. Column: id\n"
+        "2) Description: Row identifier\n"
+        "3. **Personal Data:** No\n"
+    )
+
+    assert client._parse_analysis(analysis, ["users"]) == [
+        [{"Column": "id", "Description": "Row identifier", "Personal Data": "No"}]
+    ]